@@ -1,15 +1,17 @@
 # app.py
 import streamlit as st
-import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional
-import json
-from dataclasses import dataclass, field, asdict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
-import base64
+from collections import Counter
 from datetime import datetime
+from html import escape
+from itertools import islice
 import io
-import altair as alt  # 使用Altair代替Plotly
+
+if TYPE_CHECKING:
+    import pandas as pd  # pandas在用到的页面内按需导入
 
 # 设置页面配置
 st.set_page_config(
@@ -20,7 +22,7 @@ st.set_page_config(
 )
 
 # 自定义CSS
-st.markdown("""
+_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -92,8 +94,24 @@ st.markdown("""
         background: linear-gradient(135deg, #3b82f620 0%, #2563eb40 100%);
         border-left: 5px solid #2563eb;
     }
+    .card-badge { float: right; }
+    .card-caption {
+        color: #6B7280;
+        font-size: 0.875rem;
+        margin-bottom: 0.25rem;
+    }
+    .ab-type { font-weight: bold; color: #6B7280; }
+    .ab-type-surface { color: #3B82F6; }
+    .ab-type-intracellular { color: #10B981; }
+    .ab-type-viability { color: #F59E0B; }
+    .ab-type-fc_block { color: #EF4444; }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+def inject_css():
+    """注入自定义CSS"""
+    # Streamlit每次rerun都会移除未重新输出的元素，样式需每次输出
+    st.markdown(_CSS, unsafe_allow_html=True)
 
 class AntibodyType(Enum):
     """抗体类型"""
@@ -103,7 +121,20 @@ class AntibodyType(Enum):
     FC_BLOCK = "Fc阻断剂"
     OTHER = "其他"
 
-@dataclass
+# 类型名称 -> 枚举成员
+_ANTIBODY_TYPE_BY_VALUE = {t.value: t for t in AntibodyType}
+_ANTIBODY_TYPE_OPTIONS = list(_ANTIBODY_TYPE_BY_VALUE)
+_CONTROL_TYPE_OPTIONS = ["FMO", "Isotype", "Single", "Blank"]
+_MASTERMIX_COLUMNS = ["抗体", "荧光", "每管用量 (μL)", "总需用量 (μL)"]
+# 染色矩阵中与抗体列并列的标签列，抗体不能使用这些名称
+_MATRIX_LABEL_COLUMNS = frozenset({"管子名称", "描述", "固定破膜", "对照类型"})
+# 实验计划表默认显示的行数
+_PLAN_PREVIEW_ROWS = 200
+# 表面染色master mix包含的抗体类型（按类型名称比较：每次rerun都会重新定义枚举类，
+# session_state中早先创建的抗体持有旧枚举成员，与新成员不相等）
+_SURFACE_TYPES = frozenset({AntibodyType.SURFACE.value, AntibodyType.VIABILITY.value, AntibodyType.FC_BLOCK.value})
+
+@dataclass(slots=True, frozen=True)
 class Antibody:
     """抗体信息"""
     name: str
@@ -118,29 +149,45 @@ class Antibody:
     lot_number: str = ""
     storage: str = "4°C避光"
     notes: str = ""
-    
+    search_text: str = field(default="", init=False, repr=False, compare=False)
+
     def __post_init__(self):
+        # frozen dataclass，派生字段需通过object.__setattr__写入
         if not self.short_name:
-            # 自动生成简称
-            words = self.name.split()
+            # 自动生成简称（只切出最后一个单词）
+            words = self.name.rsplit(maxsplit=1)
             if words:
-                # 取最后一个单词或第一个单词的前几个字母
-                self.short_name = words[-1][:8]
+                # 取最后一个单词的前几个字母
+                object.__setattr__(self, 'short_name', words[-1][:8])
             else:
-                self.short_name = self.name[:8]
+                object.__setattr__(self, 'short_name', self.name[:8])
+        # 搜索用的小写文本（名称、靶标、荧光染料）
+        object.__setattr__(self, 'search_text', f"{self.name}\n{self.target}\n{self.fluorochrome}".lower())
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TubeConfiguration:
     """管子配置"""
     name: str
     description: str
-    antibodies: List[str] = field(default_factory=list)
+    antibodies: Tuple[str, ...] = ()
     needs_fixation: bool = False
     is_control: bool = False
     control_type: str = ""  # FMO, Isotype, Single, Blank
+    _antibody_set: Optional[frozenset] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def antibody_set(self) -> frozenset:
+        """抗体名称集合，用于快速判断管子是否包含某抗体"""
+        if self._antibody_set is None:
+            object.__setattr__(self, '_antibody_set', frozenset(self.antibodies))
+        return self._antibody_set
 
 def init_session():
     """初始化session state"""
+    # 每个会话只初始化一次，之后的rerun直接返回
+    if st.session_state.get('_initialized'):
+        return
+
     defaults = {
         'antibodies': {},
         'tubes': {},
@@ -157,11 +204,20 @@ def init_session():
         if key not in st.session_state:
             st.session_state[key] = value
 
-def load_standard_antibodies():
-    """加载标准抗体"""
-    standard_antibodies = [
+    st.session_state['_initialized'] = True
+
+# 标准模板中的抗体名称（抗体模板与管子模板共用同一字符串对象）
+_FCX = "TruStain FcX™ (anti-mouse CD16/32) Antibody"
+_LIVE_DYE = "Live/Dye eF780"
+_CD45 = "BB515 Rat Anti-Mouse CD45"
+_ASMA = "α-SMA AF647"
+
+@st.cache_resource
+def _standard_antibodies():
+    """标准抗体模板（每个进程只构建一次）"""
+    return (
         Antibody(
-            name="TruStain FcX™ (anti-mouse CD16/32) Antibody",
+            name=_FCX,
             short_name="FcX",
             fluorochrome="None",
             target="CD16/32",
@@ -174,7 +230,7 @@ def load_standard_antibodies():
             notes="Fc受体阻断剂"
         ),
         Antibody(
-            name="Live/Dye eF780",
+            name=_LIVE_DYE,
             short_name="LiveDye",
             fluorochrome="eF780",
             target="Viability",
@@ -187,7 +243,7 @@ def load_standard_antibodies():
             notes="死活染料，建议1:1000稀释"
         ),
         Antibody(
-            name="BB515 Rat Anti-Mouse CD45",
+            name=_CD45,
             short_name="CD45",
             fluorochrome="BB515",
             target="CD45",
@@ -200,7 +256,7 @@ def load_standard_antibodies():
             notes="白细胞标记"
         ),
         Antibody(
-            name="α-SMA AF647",
+            name=_ASMA,
             short_name="α-SMA",
             fluorochrome="AF647",
             target="α-SMA",
@@ -212,14 +268,12 @@ def load_standard_antibodies():
             lot_number="345678",
             notes="胞内染色，需固定破膜"
         )
-    ]
-    
-    for ab in standard_antibodies:
-        st.session_state.antibodies[ab.name] = ab
+    )
 
-def load_standard_tubes():
-    """加载标准管子配置"""
-    standard_tubes = {
+@st.cache_resource
+def _standard_tubes():
+    """标准管子模板（每个进程只构建一次）"""
+    return {
         "Blank": TubeConfiguration(
             name="Blank",
             description="未染色对照，调节电压",
@@ -229,28 +283,28 @@ def load_standard_tubes():
         "FcX_Only": TubeConfiguration(
             name="FcX_Only",
             description="仅Fc阻断对照",
-            antibodies=["TruStain FcX™ (anti-mouse CD16/32) Antibody"],
+            antibodies=(_FCX,),
             is_control=True,
             control_type="Single"
         ),
         "Live_Only": TubeConfiguration(
             name="Live_Only",
             description="死活染料单阳（补偿）",
-            antibodies=["TruStain FcX™ (anti-mouse CD16/32) Antibody", "Live/Dye eF780"],
+            antibodies=(_FCX, _LIVE_DYE),
             is_control=True,
             control_type="Single"
         ),
         "CD45_Only": TubeConfiguration(
             name="CD45_Only",
             description="CD45单阳（补偿）",
-            antibodies=["TruStain FcX™ (anti-mouse CD16/32) Antibody", "BB515 Rat Anti-Mouse CD45"],
+            antibodies=(_FCX, _CD45),
             is_control=True,
             control_type="Single"
         ),
         "αSMA_Only": TubeConfiguration(
             name="αSMA_Only",
             description="α-SMA单阳（补偿，需破膜）",
-            antibodies=["TruStain FcX™ (anti-mouse CD16/32) Antibody", "α-SMA AF647"],
+            antibodies=(_FCX, _ASMA),
             needs_fixation=True,
             is_control=True,
             control_type="Single"
@@ -258,72 +312,116 @@ def load_standard_tubes():
         "FMO_αSMA": TubeConfiguration(
             name="FMO_αSMA",
             description="荧光减一对照（用于α-SMA设门）",
-            antibodies=["TruStain FcX™ (anti-mouse CD16/32) Antibody", "Live/Dye eF780", "BB515 Rat Anti-Mouse CD45"],
+            antibodies=(_FCX, _LIVE_DYE, _CD45),
             is_control=True,
             control_type="FMO"
         ),
         "Full_Stain": TubeConfiguration(
             name="Full_Stain",
             description="全染实验管",
-            antibodies=["TruStain FcX™ (anti-mouse CD16/32) Antibody", "Live/Dye eF780", "BB515 Rat Anti-Mouse CD45", "α-SMA AF647"],
+            antibodies=(_FCX, _LIVE_DYE, _CD45, _ASMA),
             needs_fixation=True,
             is_control=False
         )
     }
-    
-    st.session_state.tubes = standard_tubes
+
+def load_standard_antibodies():
+    """加载标准抗体"""
+    for ab in _standard_antibodies():
+        st.session_state.antibodies[ab.name] = ab
+
+def load_standard_tubes():
+    """加载标准管子配置"""
+    st.session_state.tubes = dict(_standard_tubes())
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def dataframe_to_csv(df: "pd.DataFrame") -> bytes:
+    """导出CSV（带BOM的UTF-8，Excel可直接打开）；内容不变时直接复用缓存
+
+    有无pyarrow输出的字节相同：表头由pandas写出，pyarrow只写不加引号的数据行；
+    含浮点/布尔/日期列（两者格式不同）、取值需要加引号或列内类型混杂时，改用pandas写出。
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        return _dataframe_to_csv_pandas(df)
+
+    # 单列表中pandas会给空值加引号，pyarrow不会
+    if len(df.columns) < 2 or any(dtype.kind in "fcbmM" for dtype in df.dtypes):
+        return _dataframe_to_csv_pandas(df)
+
+    sink = pa.BufferOutputStream()
+    try:
+        pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), sink,
+                         pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+    except (pa.ArrowInvalid, pa.ArrowTypeError):  # 取值需要加引号，或object列混有不同类型
+        return _dataframe_to_csv_pandas(df)
+    header = df.head(0).to_csv(index=False, lineterminator='\n')
+    return ('\ufeff' + header).encode('utf-8') + sink.getvalue().to_pybytes()
+
+def _dataframe_to_csv_pandas(df: "pd.DataFrame") -> bytes:
+    """用pandas导出CSV（带BOM的UTF-8），按块写入缓冲区"""
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    df.to_csv(buffer, index=False, lineterminator='\n', chunksize=1000)
+    return buffer.getvalue().encode('utf-8')
+
+@st.cache_data(show_spinner=False)
+def dataframe_to_parquet(df: "pd.DataFrame") -> Optional[bytes]:
+    """导出Parquet（snappy压缩）；未安装pyarrow时返回None"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    sink = pa.BufferOutputStream()
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), sink, compression='snappy')
+    return sink.getvalue().to_pybytes()
 
 def display_antibody_card(antibody: Antibody):
     """显示抗体卡片"""
-    type_colors = {
-        "表面抗体": "#3B82F6",
-        "胞内抗体": "#10B981",
-        "死活染料": "#F59E0B",
-        "Fc阻断剂": "#EF4444",
-        "其他": "#6B7280"
-    }
-    
-    color = type_colors.get(antibody.type.value, "#6B7280")
-    
-    with st.container():
-        col1, col2 = st.columns([4, 1])
-        with col1:
-            st.markdown(f"**{antibody.name}**")
-            st.caption(f"靶标: {antibody.target} | 荧光: {antibody.fluorochrome} | 克隆: {antibody.clone}")
-        with col2:
-            st.markdown(f'<span style="color:{color}; font-weight:bold;">{antibody.type.value}</span>', unsafe_allow_html=True)
-        
-        st.markdown(f"浓度: {antibody.concentration} μg/mL | 用量: {antibody.recommended_use} μg/10⁶ cells")
-        if antibody.notes:
-            st.info(antibody.notes)
-        
-        st.divider()
+    # 整张卡片拼成一段HTML一次输出
+    notes = f'<div class="info-box">{escape(antibody.notes)}</div>' if antibody.notes else ""
+    st.markdown(
+        f'<div class="antibody-card">'
+        f'<span class="card-badge ab-type ab-type-{antibody.type.name.lower()}">{antibody.type.value}</span>'
+        f'<b>{escape(antibody.name)}</b>'
+        f'<div class="card-caption">靶标: {escape(antibody.target)} | 荧光: {escape(antibody.fluorochrome)}'
+        f' | 克隆: {escape(antibody.clone)}</div>'
+        f'<div>浓度: {antibody.concentration} μg/mL | 用量: {antibody.recommended_use} μg/10⁶ cells</div>'
+        f'{notes}</div>',
+        unsafe_allow_html=True
+    )
 
 def display_tube_card(tube: TubeConfiguration):
     """显示管子卡片"""
-    with st.container():
-        card_class = "control-tube" if tube.is_control else "experiment-tube"
-        
-        col1, col2, col3 = st.columns([3, 2, 1])
-        with col1:
-            st.markdown(f"**{tube.name}**")
-            st.caption(tube.description)
-        with col2:
-            if tube.is_control:
-                st.markdown(f'**对照类型:** {tube.control_type}')
-            if tube.needs_fixation:
-                st.markdown("**需固定破膜**")
-        with col3:
-            st.markdown(f"**抗体数:** {len(tube.antibodies)}")
-        
-        if tube.antibodies:
-            with st.expander("查看抗体列表"):
-                for ab_name in tube.antibodies:
-                    if ab_name in st.session_state.antibodies:
-                        ab = st.session_state.antibodies[ab_name]
-                        st.markdown(f"- {ab.short_name} ({ab.fluorochrome})")
-        
-        st.divider()
+    card_class = "control-tube" if tube.is_control else "experiment-tube"
+    tags = []
+    if tube.is_control:
+        tags.append(f"<b>对照类型:</b> {escape(tube.control_type)}")
+    if tube.needs_fixation:
+        tags.append("<b>需固定破膜</b>")
+    tags.append(f"<b>抗体数:</b> {len(tube.antibodies)}")
+
+    # 整张卡片拼成一段HTML一次输出，抗体列表仍放在可折叠的expander中
+    st.markdown(
+        f'<div class="tube-card {card_class}">'
+        f'<b>{escape(tube.name)}</b>'
+        f'<div class="card-caption">{escape(tube.description)}</div>'
+        f'<div>{" | ".join(tags)}</div></div>',
+        unsafe_allow_html=True
+    )
+
+    if tube.antibodies:
+        antibodies = st.session_state.antibodies
+        with st.expander("查看抗体列表"):
+            # 拼成一段markdown一次输出
+            st.markdown("\n".join(
+                f"- {ab.short_name} ({ab.fluorochrome})"
+                for ab in map(antibodies.get, tube.antibodies) if ab is not None
+            ))
 
 def render_dashboard():
     """仪表盘页面"""
@@ -331,19 +429,17 @@ def render_dashboard():
     
     # 项目概览卡片
     col1, col2, col3, col4 = st.columns(4)
+    # 一次遍历统计各类型抗体数（按类型名称计数）
+    type_counts = Counter(ab.type.value for ab in st.session_state.antibodies.values())
     
     with col1:
         st.metric("抗体数量", len(st.session_state.antibodies))
     with col2:
         st.metric("管子配置", len(st.session_state.tubes))
     with col3:
-        surface_count = sum(1 for ab in st.session_state.antibodies.values() 
-                          if ab.type == AntibodyType.SURFACE)
-        st.metric("表面抗体", surface_count)
+        st.metric("表面抗体", type_counts[AntibodyType.SURFACE.value])
     with col4:
-        intracel_count = sum(1 for ab in st.session_state.antibodies.values() 
-                           if ab.type == AntibodyType.INTRACELLULAR)
-        st.metric("胞内抗体", intracel_count)
+        st.metric("胞内抗体", type_counts[AntibodyType.INTRACELLULAR.value])
     
     # 快速开始指南
     st.markdown("### 🚀 快速开始")
@@ -392,14 +488,22 @@ def render_dashboard():
         
         with overview_col1:
             st.markdown("#### 最近添加的抗体")
-            for ab in list(st.session_state.antibodies.values())[-3:]:
-                st.markdown(f"- **{ab.short_name}**: {ab.target} ({ab.fluorochrome})")
-        
+            st.markdown("\n".join(
+                f"- **{ab.short_name}**: {ab.target} ({ab.fluorochrome})"
+                for ab in _last_items(st.session_state.antibodies)
+            ))
+
         with overview_col2:
             if st.session_state.tubes:
                 st.markdown("#### 最近添加的管子")
-                for tube in list(st.session_state.tubes.values())[-3:]:
-                    st.markdown(f"- **{tube.name}**: {len(tube.antibodies)}种抗体")
+                st.markdown("\n".join(
+                    f"- **{tube.name}**: {len(tube.antibodies)}种抗体"
+                    for tube in _last_items(st.session_state.tubes)
+                ))
+
+def _last_items(d: Dict, n: int = 3) -> List:
+    """按插入顺序取字典最后n个值（反向迭代，不复制整个values）"""
+    return list(islice(reversed(d.values()), n))[::-1]
 
 def render_antibody_management():
     """抗体管理页面"""
@@ -424,7 +528,7 @@ def render_antibody_management():
                 recommended_use = st.number_input("用量 (μg/10⁶ cells)*", min_value=0.0, value=0.5)
                 antibody_type = st.selectbox(
                     "抗体类型*",
-                    options=[t.value for t in AntibodyType],
+                    options=_ANTIBODY_TYPE_OPTIONS,
                     index=0
                 )
             
@@ -437,10 +541,9 @@ def render_antibody_management():
             if submitted:
                 if not name:
                     st.error("抗体名称不能为空！")
+                elif name in _MATRIX_LABEL_COLUMNS:
+                    st.error(f"抗体名称不能为“{name}”（染色矩阵保留列名）！")
                 else:
-                    # 转换类型字符串为枚举
-                    type_map = {t.value: t for t in AntibodyType}
-                    
                     antibody = Antibody(
                         name=name,
                         target=target,
@@ -448,7 +551,7 @@ def render_antibody_management():
                         clone=clone,
                         concentration=concentration,
                         recommended_use=recommended_use,
-                        type=type_map[antibody_type],
+                        type=_ANTIBODY_TYPE_BY_VALUE[antibody_type],
                         catalog_number=catalog_number,
                         lot_number=lot_number,
                         notes=notes
@@ -458,32 +561,33 @@ def render_antibody_management():
                     st.success(f"✅ 已成功添加抗体: {name}")
     
     with tab2:
-        st.markdown(f"### 抗体库 ({len(st.session_state.antibodies)}种)")
+        render_antibody_list()
+
+@st.fragment
+def render_antibody_list():
+    """抗体列表（搜索时只重跑本片段）"""
+    st.markdown(f"### 抗体库 ({len(st.session_state.antibodies)}种)")
+    
+    if not st.session_state.antibodies:
+        st.info("暂无抗体数据")
+    else:
+        search_term = st.text_input("🔍 搜索抗体", placeholder="输入名称、靶标或荧光染料搜索")
         
-        if not st.session_state.antibodies:
-            st.info("暂无抗体数据")
+        term = search_term.lower()
+        filtered_antibodies = [ab for ab in st.session_state.antibodies.values()
+                               if not term or term in ab.search_text]
+        
+        if filtered_antibodies:
+            for ab in filtered_antibodies:
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    display_antibody_card(ab)
+                with col2:
+                    if st.button("删除", key=f"del_{ab.name}", type="secondary"):
+                        del st.session_state.antibodies[ab.name]
+                        st.rerun()
         else:
-            search_term = st.text_input("🔍 搜索抗体", placeholder="输入名称、靶标或荧光染料搜索")
-            
-            filtered_antibodies = []
-            for ab in st.session_state.antibodies.values():
-                if (not search_term or 
-                    search_term.lower() in ab.name.lower() or 
-                    search_term.lower() in ab.target.lower() or 
-                    search_term.lower() in ab.fluorochrome.lower()):
-                    filtered_antibodies.append(ab)
-            
-            if filtered_antibodies:
-                for ab in filtered_antibodies:
-                    col1, col2 = st.columns([4, 1])
-                    with col1:
-                        display_antibody_card(ab)
-                    with col2:
-                        if st.button("删除", key=f"del_{ab.name}", type="secondary"):
-                            del st.session_state.antibodies[ab.name]
-                            st.rerun()
-            else:
-                st.warning("未找到匹配的抗体")
+            st.warning("未找到匹配的抗体")
 
 def render_tube_design():
     """管子设计页面"""
@@ -511,7 +615,7 @@ def render_tube_design():
                 if is_control:
                     control_type = st.selectbox(
                         "对照类型",
-                        options=["FMO", "Isotype", "Single", "Blank"],
+                        options=_CONTROL_TYPE_OPTIONS,
                         index=0
                     )
                 else:
@@ -520,20 +624,20 @@ def render_tube_design():
             # 选择抗体
             if st.session_state.antibodies:
                 st.markdown("### 选择抗体")
-                selected_antibodies = []
-                
-                # 按类型分组显示抗体
+                antibodies = st.session_state.antibodies
+
+                # 单个多选框代替逐个抗体的复选框，选项按类型分组排列
                 antibody_types = {}
-                for ab in st.session_state.antibodies.values():
-                    if ab.type.value not in antibody_types:
-                        antibody_types[ab.type.value] = []
-                    antibody_types[ab.type.value].append(ab)
-                
-                for type_name, antibodies in antibody_types.items():
-                    with st.expander(f"{type_name} ({len(antibodies)}种)"):
-                        for ab in antibodies:
-                            if st.checkbox(f"{ab.name} ({ab.fluorochrome})", key=f"tube_{tube_name}_{ab.name}"):
-                                selected_antibodies.append(ab.name)
+                for ab in antibodies.values():
+                    antibody_types.setdefault(ab.type.value, []).append(ab.name)
+
+                selected_antibodies = st.multiselect(
+                    "选择抗体",
+                    options=[name for names in antibody_types.values() for name in names],
+                    format_func=lambda n: f"[{antibodies[n].type.value}] {n} ({antibodies[n].fluorochrome})",
+                    key="tube_antibodies",
+                    label_visibility="collapsed"
+                )
             else:
                 st.warning("请先添加抗体")
                 selected_antibodies = []
@@ -547,7 +651,7 @@ def render_tube_design():
                     tube = TubeConfiguration(
                         name=tube_name,
                         description=description,
-                        antibodies=selected_antibodies,
+                        antibodies=tuple(selected_antibodies),
                         needs_fixation=needs_fixation,
                         is_control=is_control,
                         control_type=control_type
@@ -571,8 +675,21 @@ def render_tube_design():
                         del st.session_state.tubes[tube.name]
                         st.rerun()
 
+@st.cache_data(show_spinner=False)
+def _matrix_column_config(antibody_names: tuple) -> dict:
+    """染色矩阵表的列配置，抗体列不变时复用缓存"""
+    return {
+        "管子名称": st.column_config.TextColumn(width="medium"),
+        "描述": st.column_config.TextColumn(width="large"),
+        **{ab: st.column_config.TextColumn(width="small") for ab in antibody_names},
+        "固定破膜": st.column_config.TextColumn(width="small"),
+        "对照类型": st.column_config.TextColumn(width="small")
+    }
+
 def render_matrix():
     """染色矩阵页面"""
+    import pandas as pd
+
     st.markdown('<div class="section-header">🔢 染色矩阵</div>', unsafe_allow_html=True)
     
     if not st.session_state.tubes or not st.session_state.antibodies:
@@ -580,23 +697,29 @@ def render_matrix():
         return
     
     # 创建矩阵数据
-    matrix_data = []
-    tube_names = list(st.session_state.tubes.keys())
+    tubes = st.session_state.tubes
+    tube_names = list(tubes.keys())
     antibody_names = list(st.session_state.antibodies.keys())
-    
-    for tube_name in tube_names:
-        tube = st.session_state.tubes[tube_name]
-        row = {"管子名称": tube_name, "描述": tube.description}
-        
-        for ab_name in antibody_names:
-            row[ab_name] = "✓" if ab_name in tube.antibodies else "○"
-        
-        row["固定破膜"] = "✓" if tube.needs_fixation else ""
-        row["对照类型"] = tube.control_type if tube.is_control else "实验管"
-        matrix_data.append(row)
-    
-    # 创建DataFrame
-    df = pd.DataFrame(matrix_data)
+    antibody_index = {name: j for j, name in enumerate(antibody_names)}
+
+    # 管子×抗体的布尔成员矩阵：先收集(行, 列)整数下标，再一次性散布写入
+    rows, cols = [], []
+    for i, tube_name in enumerate(tube_names):
+        for ab_name in tubes[tube_name].antibody_set:
+            j = antibody_index.get(ab_name)
+            if j is not None:
+                rows.append(i)
+                cols.append(j)
+    membership = np.zeros((len(tube_names), len(antibody_names)), dtype=bool)
+    membership[rows, cols] = True
+
+    # 按列创建DataFrame
+    df = pd.DataFrame(np.where(membership, "✓", "○"), columns=antibody_names)
+    tube_list = list(tubes.values())
+    df.insert(0, "管子名称", tube_names)
+    df.insert(1, "描述", [tube.description for tube in tube_list])
+    df["固定破膜"] = np.where([tube.needs_fixation for tube in tube_list], "✓", "")
+    df["对照类型"] = [tube.control_type if tube.is_control else "实验管" for tube in tube_list]
     
     # 显示矩阵
     st.markdown("### 染色矩阵表")
@@ -606,13 +729,7 @@ def render_matrix():
         df,
         use_container_width=True,
         hide_index=True,
-        column_config={
-            "管子名称": st.column_config.TextColumn(width="medium"),
-            "描述": st.column_config.TextColumn(width="large"),
-            **{ab: st.column_config.TextColumn(width="small") for ab in antibody_names},
-            "固定破膜": st.column_config.TextColumn(width="small"),
-            "对照类型": st.column_config.TextColumn(width="small")
-        }
+        column_config=_matrix_column_config(tuple(antibody_names))
     )
     
     # 导出选项
@@ -621,7 +738,7 @@ def render_matrix():
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        csv = df.to_csv(index=False, encoding='utf-8-sig')
+        csv = dataframe_to_csv(df)
         st.download_button(
             label="📥 下载CSV",
             data=csv,
@@ -648,31 +765,74 @@ def render_matrix():
         # 创建简单的热图
         st.markdown("### 矩阵热图预览")
         
-        # 准备热图数据
-        heatmap_data = []
-        for tube_name in tube_names:
-            tube = st.session_state.tubes[tube_name]
-            row = []
-            for ab_name in antibody_names:
-                row.append(1 if ab_name in tube.antibodies else 0)
-            heatmap_data.append(row)
-        
+        # 热图数据直接复用成员矩阵
         heatmap_df = pd.DataFrame(
-            heatmap_data,
+            membership.astype(np.int8),
             index=tube_names,
             columns=[ab.split('(')[0].strip()[:15] + '...' if len(ab) > 15 else ab.split('(')[0].strip() 
                     for ab in antibody_names]
         )
         
-        # 显示为样式化的表格
-        def color_cells(val):
-            return 'background-color: #10B981' if val == 1 else 'background-color: #F3F4F6'
-        
+        # 显示为样式化的表格（按列整体着色）
+        def color_column(col):
+            return np.where(col.to_numpy() == 1, 'background-color: #10B981', 'background-color: #F3F4F6')
+
         st.dataframe(
-            heatmap_df.style.applymap(color_cells),
+            heatmap_df.style.apply(color_column, axis=0),
             use_container_width=True
         )
 
+# 母液/工作液配制说明模板
+_SURFACE_GUIDE_TEMPLATE = """
+**配制说明:**
+
+- **总体积:** {total_volume} μL
+- **适用管子:** {tubes}
+- **配制步骤:**
+  1. 取洁净EP管
+  2. 按上表加入各抗体
+  3. 用流式染色缓冲液补至{total_volume} μL
+  4. 涡旋混匀，4°C避光保存
+"""
+
+_INTRACEL_GUIDE_TEMPLATE = """
+**配制说明:**
+
+- **总体积:** {total_volume} μL
+- **稀释剂:** 1X破膜缓冲液
+- **适用管子:** {tubes}
+- **配制步骤:**
+  1. 用1X破膜缓冲液配制
+  2. 按上表加入各抗体
+  3. 用破膜缓冲液补至{total_volume} μL
+  4. 涡旋混匀，4°C避光保存
+"""
+
+def _mastermix_rows(antibodies: Dict[str, Antibody], per_tube_vols: Dict[str, float]) -> tuple:
+    """取出配方表所需的抗体参数（可哈希，用作缓存键）"""
+    return tuple((ab.short_name, ab.fluorochrome, per_tube_vols[ab_name]) for ab_name, ab in antibodies.items())
+
+@st.cache_data(show_spinner=False)
+def _build_mastermix_table(rows: tuple, n_tubes: int, extra_tubes: int, volume_per_tube: float):
+    """生成母液/工作液配方表，返回(配方表, 总体积)"""
+    import pandas as pd
+
+    total_tubes = n_tubes + extra_tubes
+    data = [(short_name, fluorochrome, round(per_tube_vol, 2), round(per_tube_vol * total_tubes, 2))
+            for short_name, fluorochrome, per_tube_vol in rows]
+    return pd.DataFrame(data, columns=_MASTERMIX_COLUMNS), volume_per_tube * total_tubes
+
+def _show_mastermix(df: "pd.DataFrame", guide: str):
+    """左侧显示配方表，右侧显示配制说明"""
+    col_table, col_guide = st.columns([2, 1])
+
+    with col_table:
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+    with col_guide:
+        st.info(guide)
+
+@st.fragment
 def render_mastermix_calculator():
     """母液计算器页面"""
     st.markdown('<div class="section-header">🧪 母液配方计算器</div>', unsafe_allow_html=True)
@@ -722,130 +882,119 @@ def render_mastermix_calculator():
             step=1
         )
     
-    st.session_state.volumes.update({
-        'cell_count': cell_count,
-        'per_tube': per_tube,
-        'intracellular_per_tube': intracel_volume,
-        'extra_tubes': extra_tubes
-    })
+    # 只写回发生变化的参数
+    volumes = st.session_state.volumes
+    for key, value in (('cell_count', cell_count),
+                       ('per_tube', per_tube),
+                       ('intracellular_per_tube', intracel_volume),
+                       ('extra_tubes', extra_tubes)):
+        if volumes.get(key) != value:
+            volumes[key] = value
     
-    # 统计管子
+    # 统计管子，并在同一次遍历中汇总母液/工作液所需抗体（每种抗体只保留一次）
+    antibodies = st.session_state.antibodies
     surface_tubes = []
     intracellular_tubes = []
-    
+    surface_abs = {}
+    intracel_abs = {}
+
     for tube_name, tube in st.session_state.tubes.items():
         if tube.needs_fixation:
             intracellular_tubes.append(tube_name)
         elif tube.antibodies:
             surface_tubes.append(tube_name)
+        else:
+            continue
+
+        for ab_name in tube.antibodies:
+            ab = antibodies.get(ab_name)
+            if ab is None:
+                continue
+            if tube.needs_fixation:
+                if ab.type.value == AntibodyType.INTRACELLULAR.value:
+                    intracel_abs.setdefault(ab_name, ab)
+            elif ab.type.value in _SURFACE_TYPES:
+                surface_abs.setdefault(ab_name, ab)
     
+    # 每种抗体的每管用量：浓度/推荐用量取成数组后一次向量化计算（浓度为0时无法计算，记为NaN）
+    n_abs = len(antibodies)
+    concentrations = np.fromiter((ab.concentration for ab in antibodies.values()), dtype=np.float64, count=n_abs)
+    recommended = np.fromiter((ab.recommended_use for ab in antibodies.values()), dtype=np.float64, count=n_abs)
+    vols = np.divide(recommended * cell_count, concentrations,
+                     out=np.full(n_abs, np.nan), where=concentrations != 0)
+    per_tube_vols = dict(zip(antibodies, vols.tolist()))
+
     # 计算结果
     st.markdown("### 📊 计算结果")
     
+    # 浓度为0的抗体在配方表中留空，并列出提醒用户
+    zero_conc = [ab.name for ab in {**surface_abs, **intracel_abs}.values() if ab.concentration == 0]
+    if zero_conc:
+        st.warning(f"以下抗体浓度为0，无法计算用量，请检查抗体浓度：{', '.join(zero_conc)}")
+    
     if surface_tubes:
         st.markdown(f"#### 🔬 表面染色母液 (用于 {len(surface_tubes)} 管)")
         
-        total_surface_tubes = len(surface_tubes) + extra_tubes
-        total_surface_volume = per_tube * total_surface_tubes
-        
-        surface_data = []
-        
-        for tube_name in surface_tubes:
-            tube = st.session_state.tubes[tube_name]
-            for ab_name in tube.antibodies:
-                if ab_name in st.session_state.antibodies:
-                    ab = st.session_state.antibodies[ab_name]
-                    if ab.type in [AntibodyType.SURFACE, AntibodyType.VIABILITY, AntibodyType.FC_BLOCK]:
-                        per_tube_vol = (ab.recommended_use * cell_count) / ab.concentration
-                        total_vol = per_tube_vol * total_surface_tubes
-                        
-                        surface_data.append({
-                            "抗体": ab.short_name,
-                            "荧光": ab.fluorochrome,
-                            "每管用量 (μL)": round(per_tube_vol, 2),
-                            "总需用量 (μL)": round(total_vol, 2)
-                        })
-        
-        if surface_data:
-            surface_df = pd.DataFrame(surface_data).drop_duplicates(subset=["抗体"])
-            
-            col_surf1, col_surf2 = st.columns([2, 1])
-            
-            with col_surf1:
-                st.dataframe(
-                    surface_df,
-                    use_container_width=True,
-                    hide_index=True
-                )
-            
-            with col_surf2:
-                st.info(f"""
-                **配制说明:**
-                
-                - **总体积:** {total_surface_volume} μL
-                - **适用管子:** {', '.join(surface_tubes)}
-                - **配制步骤:**
-                  1. 取洁净EP管
-                  2. 按上表加入各抗体
-                  3. 用流式染色缓冲液补至{total_surface_volume} μL
-                  4. 涡旋混匀，4°C避光保存
-                """)
+        surface_df, total_surface_volume = _build_mastermix_table(
+            _mastermix_rows(surface_abs, per_tube_vols), len(surface_tubes), extra_tubes, per_tube)
+
+        if not surface_df.empty:
+            _show_mastermix(surface_df, _SURFACE_GUIDE_TEMPLATE.format(
+                total_volume=total_surface_volume, tubes=', '.join(surface_tubes)))
     
     if intracellular_tubes:
         st.markdown(f"#### 🧫 胞内染色工作液 (用于 {len(intracellular_tubes)} 管)")
         
-        total_intracel_tubes = len(intracellular_tubes) + extra_tubes
-        total_intracel_volume = intracel_volume * total_intracel_tubes
-        
-        intracel_data = []
-        
-        for tube_name in intracellular_tubes:
-            tube = st.session_state.tubes[tube_name]
-            for ab_name in tube.antibodies:
-                if ab_name in st.session_state.antibodies:
-                    ab = st.session_state.antibodies[ab_name]
-                    if ab.type == AntibodyType.INTRACELLULAR:
-                        per_tube_vol = (ab.recommended_use * cell_count) / ab.concentration
-                        total_vol = per_tube_vol * total_intracel_tubes
-                        
-                        intracel_data.append({
-                            "抗体": ab.short_name,
-                            "荧光": ab.fluorochrome,
-                            "每管用量 (μL)": round(per_tube_vol, 2),
-                            "总需用量 (μL)": round(total_vol, 2)
-                        })
-        
-        if intracel_data:
-            intracel_df = pd.DataFrame(intracel_data).drop_duplicates(subset=["抗体"])
-            
-            col_int1, col_int2 = st.columns([2, 1])
-            
-            with col_int1:
-                st.dataframe(
-                    intracel_df,
-                    use_container_width=True,
-                    hide_index=True
-                )
-            
-            with col_int2:
-                st.info(f"""
-                **配制说明:**
-                
-                - **总体积:** {total_intracel_volume} μL
-                - **稀释剂:** 1X破膜缓冲液
-                - **适用管子:** {', '.join(intracellular_tubes)}
-                - **配制步骤:**
-                  1. 用1X破膜缓冲液配制
-                  2. 按上表加入各抗体
-                  3. 用破膜缓冲液补至{total_intracel_volume} μL
-                  4. 涡旋混匀，4°C避光保存
-                """)
+        intracel_df, total_intracel_volume = _build_mastermix_table(
+            _mastermix_rows(intracel_abs, per_tube_vols), len(intracellular_tubes), extra_tubes, intracel_volume)
+
+        if not intracel_df.empty:
+            _show_mastermix(intracel_df, _INTRACEL_GUIDE_TEMPLATE.format(
+                total_volume=total_intracel_volume, tubes=', '.join(intracellular_tubes)))
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _build_plan(groups: tuple, replicates: int, tube_rows: tuple) -> "pd.DataFrame":
+    """生成实验计划表（实验组 × 重复 × 管子），输入不变时直接复用缓存"""
+    import pandas as pd
+
+    raw = pd.DataFrame(list(tube_rows),
+                       columns=["管子类型", "描述", "抗体数", "needs_fixation", "is_control", "control_type"])
+    tubes_df = pd.DataFrame({
+        "管子类型": raw["管子类型"],
+        "描述": raw["描述"],
+        "抗体数": raw["抗体数"],
+        "固定破膜": np.where(raw["needs_fixation"].to_numpy(dtype=bool), "是", "否"),
+        "对照类型": np.where(raw["is_control"].to_numpy(dtype=bool), raw["control_type"].to_numpy(), "实验管")
+    })
+
+    # 实验组 × 重复 × 管子：实验组整块重复，管子信息按(组, 重复)平铺，不需要再按管子名称关联
+    n_tubes = len(tubes_df)
+    n_blocks = len(groups) * replicates
+    group_prefix = np.array([g[:3] for g in groups], dtype=object)
+    tube_prefix = np.array([name[:8] for name in tubes_df["管子类型"]], dtype=object)
+    plan_df = pd.DataFrame({
+        "实验组": np.repeat(np.array(groups, dtype=object), replicates * n_tubes),
+        "重复": np.tile(np.repeat(np.arange(1, replicates + 1), n_tubes), len(groups)),
+        **{col: np.tile(tubes_df[col].to_numpy(), n_blocks) for col in tubes_df.columns}
+    })
+
+    # 样品ID：前缀只在实验组/管子的唯一值上截取，再用StringDtype列做向量化拼接
+    plan_df.insert(0, "样品ID",
+                   pd.Series(np.repeat(group_prefix, replicates * n_tubes), dtype="string")
+                   + "_R" + plan_df["重复"].astype("string")
+                   + "_" + pd.Series(np.tile(tube_prefix, n_blocks), dtype="string"))
+
+    # 取值很少的重复字符串列改用分类类型存储
+    for col in ("实验组", "管子类型", "固定破膜", "对照类型"):
+        plan_df[col] = plan_df[col].astype("category")
+    return plan_df
 
 def render_experiment_planner():
     """实验计划页面"""
     st.markdown('<div class="section-header">📋 实验计划生成器</div>', unsafe_allow_html=True)
     
-    if not st.session_state.tubes:
+    tubes = st.session_state.tubes
+    if not tubes:
         st.warning("请先配置管子")
         return
     
@@ -875,92 +1024,91 @@ def render_experiment_planner():
             st.session_state.experiment_groups = groups
             st.session_state.experiment_replicates = replicates
     
+    if 'experiment_groups' not in st.session_state:
+        return
+
+    # 绑定为局部变量，避免反复经由session_state代理取值
+    plan_groups = st.session_state.experiment_groups
+    plan_replicates = st.session_state.experiment_replicates
+    project = st.session_state.current_project
+
     with col2:
-        if 'experiment_groups' in st.session_state:
-            st.markdown("### 实验计划概览")
-            
-            total_samples = len(st.session_state.experiment_groups) * \
-                          st.session_state.experiment_replicates * \
-                          len(st.session_state.tubes)
-            
-            st.metric("实验组数", len(st.session_state.experiment_groups))
-            st.metric("每组重复", st.session_state.experiment_replicates)
-            st.metric("总样品数", total_samples)
-    
-    if 'experiment_groups' in st.session_state:
-        st.markdown("### 📊 详细实验计划")
-        
-        # 生成计划数据
-        plan_data = []
-        sample_id = 1
-        
-        for group in st.session_state.experiment_groups:
-            for rep in range(1, st.session_state.experiment_replicates + 1):
-                for tube_name, tube in st.session_state.tubes.items():
-                    plan_data.append({
-                        "样品ID": f"{group[:3]}_R{rep}_{tube_name[:8]}",
-                        "实验组": group,
-                        "重复": rep,
-                        "管子类型": tube_name,
-                        "描述": tube.description,
-                        "抗体数": len(tube.antibodies),
-                        "固定破膜": "是" if tube.needs_fixation else "否",
-                        "对照类型": tube.control_type if tube.is_control else "实验管"
-                    })
+        st.markdown("### 实验计划概览")
         
-        plan_df = pd.DataFrame(plan_data)
+        total_samples = len(plan_groups) * plan_replicates * len(tubes)
         
-        # 显示计划表
-        st.dataframe(
-            plan_df,
-            use_container_width=True,
-            hide_index=True
+        st.metric("实验组数", len(plan_groups))
+        st.metric("每组重复", plan_replicates)
+        st.metric("总样品数", total_samples)
+    
+    st.markdown("### 📊 详细实验计划")
+    
+    # 管子信息与实验组/重复无关，每个管子只取一次
+    tube_rows = tuple(
+        (tube_name, tube.description, len(tube.antibodies),
+         tube.needs_fixation, tube.is_control, tube.control_type)
+        for tube_name, tube in tubes.items()
+    )
+    plan_df = _build_plan(tuple(plan_groups), plan_replicates, tube_rows)
+    
+    # 显示计划表（样品较多时默认只显示前面部分）
+    show_all = len(plan_df) <= _PLAN_PREVIEW_ROWS or st.checkbox("显示全部样品", value=False)
+    st.dataframe(
+        plan_df if show_all else plan_df.head(_PLAN_PREVIEW_ROWS),
+        use_container_width=True,
+        hide_index=True
+    )
+    if not show_all:
+        st.caption(f"显示前 {_PLAN_PREVIEW_ROWS} 个样品，共 {len(plan_df)} 个")
+    
+    # 导出选项
+    st.markdown("### 导出选项")
+    
+    col_exp1, col_exp2, col_exp3 = st.columns(3)
+    
+    with col_exp1:
+        plan_csv = dataframe_to_csv(plan_df)
+        st.download_button(
+            label="📥 下载实验计划 (CSV)",
+            data=plan_csv,
+            file_name=f"{project}_plan.csv",
+            mime="text/csv",
+            use_container_width=True
         )
-        
-        # 导出选项
-        st.markdown("### 导出选项")
-        
-        col_exp1, col_exp2 = st.columns(2)
-        
-        with col_exp1:
-            csv = plan_df.to_csv(index=False, encoding='utf-8-sig')
-            st.download_button(
-                label="📥 下载实验计划 (CSV)",
-                data=csv,
-                file_name=f"{st.session_state.current_project}_plan.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
-        
-        with col_exp2:
-            # 工作单
-            worksheet_df = plan_df[["样品ID", "实验组", "重复", "管子类型", "固定破膜"]].copy()
-            worksheet_csv = worksheet_df.to_csv(index=False, encoding='utf-8-sig')
+    
+    with col_exp2:
+        # 工作单只取计划表的部分列
+        worksheet_csv = dataframe_to_csv(plan_df[["样品ID", "实验组", "重复", "管子类型", "固定破膜"]])
+        st.download_button(
+            label="📝 下载工作单",
+            data=worksheet_csv,
+            file_name=f"{project}_worksheet.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+
+    with col_exp3:
+        plan_parquet = dataframe_to_parquet(plan_df)
+        if plan_parquet is not None:
             st.download_button(
-                label="📝 下载工作单",
-                data=worksheet_csv,
-                file_name=f"{st.session_state.current_project}_worksheet.csv",
-                mime="text/csv",
+                label="📦 下载实验计划 (Parquet)",
+                data=plan_parquet,
+                file_name=f"{project}_plan.parquet",
+                mime="application/octet-stream",
                 use_container_width=True
             )
+        else:
+            st.caption("安装pyarrow后可导出Parquet格式")
 
-def render_protocol():
-    """实验方案页面"""
-    st.markdown('<div class="section-header">📖 实验方案生成</div>', unsafe_allow_html=True)
-    
-    if not st.session_state.tubes:
-        st.warning("请先配置管子")
-        return
-    
-    # 生成实验方案
-    protocol = f"""
+# 实验方案模板
+_PROTOCOL_TEMPLATE = """
 # 流式细胞术染色实验方案
 
 ## 项目信息
-- **项目名称**: {st.session_state.current_project}
-- **生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M')}
-- **抗体种类**: {len(st.session_state.antibodies)}种
-- **管子配置**: {len(st.session_state.tubes)}种
+- **项目名称**: {project}
+- **生成时间**: {generated_at}
+- **抗体种类**: {n_antibodies}种
+- **管子配置**: {n_tubes}种
 
 ## 实验步骤
 
@@ -972,7 +1120,7 @@ def render_protocol():
 
 ### 2. Fc受体阻断与表面染色
 1. 配制表面染色母液
-2. 向对应管子中加入{st.session_state.volumes['per_tube']}μL母液
+2. 向对应管子中加入{per_tube}μL母液
 3. 4°C避光孵育30分钟
 4. 加入1mL预冷染色缓冲液，300g 4°C离心5分钟
 5. 弃上清，重复洗涤一次
@@ -985,7 +1133,7 @@ def render_protocol():
 
 ### 4. 胞内染色
 1. 用1X破膜缓冲液配制胞内抗体工作液
-2. 向对应管子中加入{st.session_state.volumes['intracellular_per_tube']}μL工作液
+2. 向对应管子中加入{intracellular_per_tube}μL工作液
 3. 4°C避光孵育45分钟
 4. 用1X破膜缓冲液洗涤2次
 
@@ -1006,6 +1154,34 @@ def render_protocol():
 - 抗体现配现用
 - 设置正确的补偿
 """
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _build_protocol(project: str, generated_at: str, n_antibodies: int, n_tubes: int,
+                    per_tube: float, intracellular_per_tube: float) -> tuple:
+    """生成实验方案，返回(文本, UTF-8字节)；生成时间精确到分钟，参数不变时复用缓存"""
+    protocol = _PROTOCOL_TEMPLATE.format(
+        project=project, generated_at=generated_at, n_antibodies=n_antibodies, n_tubes=n_tubes,
+        per_tube=per_tube, intracellular_per_tube=intracellular_per_tube)
+    return protocol, protocol.encode('utf-8')
+
+def render_protocol():
+    """实验方案页面"""
+    st.markdown('<div class="section-header">📖 实验方案生成</div>', unsafe_allow_html=True)
+    
+    if not st.session_state.tubes:
+        st.warning("请先配置管子")
+        return
+    
+    # 生成实验方案
+    volumes = st.session_state.volumes
+    protocol, protocol_bytes = _build_protocol(
+        st.session_state.current_project,
+        datetime.now().strftime('%Y-%m-%d %H:%M'),
+        len(st.session_state.antibodies),
+        len(st.session_state.tubes),
+        volumes['per_tube'],
+        volumes['intracellular_per_tube']
+    )
     
     # 显示方案
     st.markdown(protocol)
@@ -1015,12 +1191,34 @@ def render_protocol():
     
     st.download_button(
         label="📄 下载实验方案 (TXT)",
-        data=protocol,
+        data=protocol_bytes,
         file_name=f"{st.session_state.current_project}_protocol.txt",
         mime="text/plain",
         use_container_width=True
     )
 
+# 导航菜单：显示名称 -> 页面key
+_PAGES = {
+    "🏠 仪表盘": "dashboard",
+    "🧪 抗体管理": "antibodies",
+    "🧫 管子设计": "tubes",
+    "🔢 染色矩阵": "matrix",
+    "🧪 母液计算": "mastermix",
+    "📋 实验计划": "planner",
+    "📖 实验方案": "protocol"
+}
+_PAGE_LABELS = tuple(_PAGES)
+# 页面key -> 菜单位置
+_PAGE_INDEX = {page: i for i, page in enumerate(_PAGES.values())}
+
+_SIDEBAR_HELP = """
+        1. 从"抗体管理"开始添加抗体
+        2. 在"管子设计"中配置实验管
+        3. 查看"染色矩阵"确认配置
+        4. 使用"母液计算"获取配方
+        5. 生成"实验计划"和"实验方案"
+        """
+
 def render_sidebar():
     """侧边栏"""
     with st.sidebar:
@@ -1037,27 +1235,17 @@ def render_sidebar():
         # 导航菜单
         st.markdown("### 📋 导航菜单")
         
-        pages = {
-            "🏠 仪表盘": "dashboard",
-            "🧪 抗体管理": "antibodies",
-            "🧫 管子设计": "tubes",
-            "🔢 染色矩阵": "matrix",
-            "🧪 母液计算": "mastermix",
-            "📋 实验计划": "planner",
-            "📖 实验方案": "protocol"
-        }
-        
         if 'page' not in st.session_state:
             st.session_state.page = "dashboard"
         
         selected = st.radio(
             "选择页面",
-            options=list(pages.keys()),
-            index=list(pages.values()).index(st.session_state.page) if st.session_state.page in pages.values() else 0,
+            options=_PAGE_LABELS,
+            index=_PAGE_INDEX.get(st.session_state.page, 0),
             label_visibility="collapsed"
         )
         
-        st.session_state.page = pages[selected]
+        st.session_state.page = _PAGES[selected]
         
         st.markdown("---")
         
@@ -1073,16 +1261,23 @@ def render_sidebar():
         
         st.markdown("---")
         st.markdown("### ℹ️ 使用说明")
-        st.markdown("""
-        1. 从"抗体管理"开始添加抗体
-        2. 在"管子设计"中配置实验管
-        3. 查看"染色矩阵"确认配置
-        4. 使用"母液计算"获取配方
-        5. 生成"实验计划"和"实验方案"
-        """)
+        st.markdown(_SIDEBAR_HELP)
+
+# 页面key -> 渲染函数
+_PAGE_DISPATCH = {
+    "dashboard": render_dashboard,
+    "antibodies": render_antibody_management,
+    "tubes": render_tube_design,
+    "matrix": render_matrix,
+    "mastermix": render_mastermix_calculator,
+    "planner": render_experiment_planner,
+    "protocol": render_protocol
+}
 
 def main():
     """主函数"""
+    inject_css()
+
     # 初始化session state
     init_session()
     
@@ -1090,22 +1285,7 @@ def main():
     render_sidebar()
     
     # 根据选择渲染页面
-    page = st.session_state.get('page', 'dashboard')
-    
-    if page == "dashboard":
-        render_dashboard()
-    elif page == "antibodies":
-        render_antibody_management()
-    elif page == "tubes":
-        render_tube_design()
-    elif page == "matrix":
-        render_matrix()
-    elif page == "mastermix":
-        render_mastermix_calculator()
-    elif page == "planner":
-        render_experiment_planner()
-    elif page == "protocol":
-        render_protocol()
+    _PAGE_DISPATCH.get(st.session_state.get('page', 'dashboard'), render_dashboard)()
 
 if __name__ == "__main__":
     main()